@@ -0,0 +1,462 @@
+"""Serwer wizualizacji na żywo: mapy Range-Doppler / Range-Angle przez WebSocket
+
+Przetwarzanie publikuje ramki metodą publish() bez blokowania. Każdy klient ma
+własną "skrzynkę" na najnowszą ramkę - wolny klient gubi ramki zamiast
+spowalniać pętlę radaru 10 Hz.
+
+Uruchomienie z odtwarzaniem plików:
+    python live_server.py <folder_z_plikami_cf32> [port]
+Podgląd w przeglądarce: http://localhost:8765/?decimate=1&delta=1
+"""
+import asyncio
+import base64
+import hashlib
+import struct
+import sys
+import threading
+import time
+import zlib
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+
+import main as radar
+from main import (RadarFramePrefetcher, generate_range_doppler_map, generate_range_angle_map,
+                  calculate_range_axis, calculate_angle_axis)
+
+# --- KONFIGURACJA SERWERA ---
+LIVE_HOST = '127.0.0.1'    # Tylko lokalnie; '0.0.0.0' udostępnia podgląd w sieci
+LIVE_PORT = 8765
+LIVE_FRAME_RATE = 10      # Hz - tempo odtwarzania plików (jak pętla radaru)
+KEYFRAME_INTERVAL = 30    # Co ile ramek pełna ramka zamiast delty
+MAX_CLIENT_FRAME = 125    # [B] klienci wysyłają tylko ramki sterujące (ping/close)
+QUANT_TOLERANCE = 3.0     # [dB] zakres kwantyzacji zmieniany dopiero po takim odchyleniu percentyli
+
+# Format ramki binarnej (little-endian):
+# magic, wersja, flagi, frame_id, wymiary RD i RA, liczba detekcji i tracków,
+# zakresy kwantyzacji [dB] RD i RA, maksymalny zasięg [m]
+FRAME_MAGIC = b'RDFM'
+FRAME_VERSION = 1
+FRAME_HEADER = struct.Struct('<4sBBHIHHHHHHfffff')
+FLAG_DELTA = 0x01         # Mapy jako różnica względem poprzedniej wysłanej ramki (mod 256)
+FLAG_ZLIB = 0x02          # Dane map skompresowane zlib
+
+WS_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+def quantize_map(db_map, low_percentile=5, high_percentile=95, current_range=None):
+    """Kwantyzuje mapę w dB do uint8 (zakres z percentyli jak na wykresach)"""
+    vmin = float(np.percentile(db_map, low_percentile))
+    vmax = float(np.percentile(db_map, high_percentile))
+    if (current_range is not None and abs(vmin - current_range[0]) <= QUANT_TOLERANCE
+            and abs(vmax - current_range[1]) <= QUANT_TOLERANCE):
+        # Stały zakres między ramkami - inaczej każdy piksel zmienia się i delta nie jest zerowa
+        vmin, vmax = current_range
+    scale = 255.0 / (vmax - vmin) if vmax > vmin else 0.0
+    quantized = np.clip((db_map - vmin) * scale, 0, 255).astype(np.uint8)
+    return quantized, vmin, vmax
+
+def encode_frame(frame, previous=None):
+    """Koduje ramkę do formatu binarnego; z previous - jako delta (mod 256) + zlib"""
+    rd, ra = frame['rd'], frame['ra']
+    flags = 0
+
+    if previous is not None:
+        # Odejmowanie uint8 zawija się modulo 256 - klient dodaje z & 0xFF
+        rd_bytes = (rd - previous['rd']).tobytes()
+        ra_bytes = (ra - previous['ra']).tobytes()
+        flags |= FLAG_DELTA
+    else:
+        rd_bytes = rd.tobytes()
+        ra_bytes = ra.tobytes()
+
+    maps = rd_bytes + ra_bytes
+    if previous is not None:
+        maps = zlib.compress(maps, 1)
+        flags |= FLAG_ZLIB
+
+    header = FRAME_HEADER.pack(
+        FRAME_MAGIC, FRAME_VERSION, flags, 0, frame['frame_id'],
+        rd.shape[0], rd.shape[1], ra.shape[0], ra.shape[1],
+        len(frame['detections']), len(frame['tracks']),
+        frame['rd_range'][0], frame['rd_range'][1],
+        frame['ra_range'][0], frame['ra_range'][1],
+        frame['max_range'])
+
+    return b''.join([header, struct.pack('<I', len(maps)), maps,
+                     frame['detections'].tobytes(), frame['tracks'].tobytes()])
+
+def websocket_frame(payload, opcode=0x2):
+    """Buduje ramkę WebSocket serwer->klient (FIN, bez maski)"""
+    length = len(payload)
+    if length < 126:
+        header = struct.pack('!BB', 0x80 | opcode, length)
+    elif length < 65536:
+        header = struct.pack('!BBH', 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+    return header + payload
+
+async def read_websocket_frame(reader):
+    """Czyta jedną ramkę od klienta, zwraca (opcode, payload)"""
+    b1, b2 = await reader.readexactly(2)
+    opcode = b1 & 0x0F
+    length = b2 & 0x7F
+    if length == 126:
+        length, = struct.unpack('!H', await reader.readexactly(2))
+    elif length == 127:
+        length, = struct.unpack('!Q', await reader.readexactly(8))
+    if length > MAX_CLIENT_FRAME:
+        # Nie alokujemy bufora o długości podanej przez klienta
+        raise ValueError(f"Ramka klienta za duża: {length} B")
+    mask = await reader.readexactly(4) if b2 & 0x80 else None
+    payload = await reader.readexactly(length)
+    if mask:
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+    return opcode, payload
+
+def parse_client_options(path):
+    """Opcje klienta z query string: (decymacja, delta); błędna decymacja -> 1"""
+    query = parse_qs(urlparse(path).query)
+    try:
+        decimation = max(1, int(query.get('decimate', ['1'])[0]))
+    except ValueError:
+        decimation = 1
+    return decimation, query.get('delta', ['0'])[0] == '1'
+
+class LiveClient:
+    """Stan jednego klienta: skrzynka na najnowszą ramkę, decymacja, delta"""
+
+    def __init__(self, writer, decimation=1, delta=False):
+        self.writer = writer
+        self.decimation = max(1, decimation)
+        self.delta = delta
+        self.latest = None             # Najnowsza nie wysłana ramka (rozmiar 1)
+        self.wakeup = asyncio.Event()
+        self.previous = None           # Ostatnia wysłana ramka (referencja dla delty)
+        self.since_keyframe = 0
+        self.published = 0
+        self.sent = 0
+        self.dropped = 0
+        self.bytes_sent = 0
+
+    def offer(self, frame):
+        """Podmienia ramkę w skrzynce - poprzednia nie wysłana jest gubiona"""
+        self.published += 1
+        if (self.published - 1) % self.decimation:
+            return
+        if self.latest is not None:
+            self.dropped += 1
+        self.latest = frame
+        self.wakeup.set()
+
+class LiveVisualizationServer:
+    """Serwer asyncio w osobnym wątku; publish() wołane z wątku przetwarzania"""
+
+    def __init__(self, host=LIVE_HOST, port=LIVE_PORT):
+        self.host = host
+        self.port = port
+        self.clients = set()
+        self.frame_id = 0
+        self.publish_time = 0.0   # Czas spędzony w publish() po stronie przetwarzania
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._tasks = set()
+        self._ranges = {'rd': None, 'ra': None}   # Bieżące zakresy kwantyzacji [dB]
+        self._started = threading.Event()
+        self._start_error = None
+
+    # --- API dla wątku przetwarzania ---
+
+    def start(self):
+        """Uruchamia pętlę asyncio w wątku w tle i czeka na nasłuch"""
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._started.wait()
+        if self._start_error is not None:
+            # Np. port zajęty lub zły adres - błąd z wątku w tle zgłaszamy wywołującemu
+            self._thread.join()
+            error, self._start_error = self._start_error, None
+            raise error
+        print(f"LIVE: serwer nasłuchuje na ws://{self.host}:{self.port}/")
+        return self
+
+    def publish(self, rd_map, ra_map, detections=(), tracks=(), max_range=None):
+        """Kwantyzuje mapy i przekazuje ramkę klientom - nigdy nie czeka na sieć"""
+        t0 = time.perf_counter()
+        if max_range is None:
+            # Odczyt w chwili publikacji - profil kalibracji może zmienić zasięg
+            max_range = radar.MAX_RANGE
+        rd, rd_min, rd_max = quantize_map(rd_map, current_range=self._ranges['rd'])
+        ra, ra_min, ra_max = quantize_map(ra_map, 10, 90, current_range=self._ranges['ra'])
+        self._ranges = {'rd': (rd_min, rd_max), 'ra': (ra_min, ra_max)}
+
+        self.frame_id += 1
+        frame = {
+            'frame_id': self.frame_id,
+            'rd': rd,
+            'ra': ra,
+            'rd_range': (rd_min, rd_max),
+            'ra_range': (ra_min, ra_max),
+            'max_range': float(max_range),
+            # Detekcje: (zasięg [m], kąt [°], moc [dB]); tracki: (id, zasięg, kąt, prędkość)
+            'detections': np.asarray(detections, dtype=np.float32).reshape(-1, 3),
+            'tracks': np.asarray(tracks, dtype=np.float32).reshape(-1, 4),
+        }
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._dispatch, frame)
+        self.publish_time += time.perf_counter() - t0
+        return frame
+
+    def stop(self):
+        """Zamyka połączenia i zatrzymuje pętlę"""
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop = None
+
+    def stats(self):
+        """Statystyki per klient: wysłane / zgubione ramki i bajty"""
+        return [{'peer': c.writer.get_extra_info('peername'), 'sent': c.sent,
+                 'dropped': c.dropped, 'bytes': c.bytes_sent,
+                 'decimation': c.decimation, 'delta': c.delta}
+                for c in list(self.clients)]
+
+    # --- Wnętrze pętli asyncio ---
+
+    def _run(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            self._server = loop.run_until_complete(
+                asyncio.start_server(self._handle_connection, self.host, self.port))
+        except Exception as exc:
+            self._start_error = exc
+            loop.close()
+            self._started.set()
+            return
+        if self.port == 0:
+            self.port = self._server.sockets[0].getsockname()[1]
+        self._loop = loop
+        self._started.set()
+        loop.run_forever()
+        loop.close()
+
+    def _dispatch(self, frame):
+        for client in self.clients:
+            client.offer(frame)
+
+    async def _shutdown(self):
+        self._server.close()
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self._server.wait_closed()
+
+    async def _handle_connection(self, reader, writer):
+        task = asyncio.current_task()
+        self._tasks.add(task)
+        try:
+            await self._serve_client(reader, writer)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._tasks.discard(task)
+            writer.close()
+
+    async def _serve_client(self, reader, writer):
+        try:
+            request = await reader.readuntil(b'\r\n\r\n')
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            return
+
+        lines = request.decode('latin-1').split('\r\n')
+        path = lines[0].split(' ')[1] if len(lines[0].split(' ')) > 1 else '/'
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                key, value = line.split(':', 1)
+                headers[key.strip().lower()] = value.strip()
+
+        if headers.get('upgrade', '').lower() != 'websocket':
+            # Zwykłe żądanie HTTP - strona podglądu
+            body = VIEWER_HTML.encode('utf-8')
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/html; charset=utf-8\r\n'
+                         + f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode()
+                         + body)
+            await writer.drain()
+            return
+
+        # Opcje klienta z query string: ?decimate=N&delta=1 (przed odpowiedzią 101)
+        decimation, delta = parse_client_options(path)
+
+        accept = base64.b64encode(hashlib.sha1(
+            (headers.get('sec-websocket-key', '') + WS_GUID).encode()).digest()).decode()
+        writer.write(('HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n'
+                      f'Connection: Upgrade\r\nSec-WebSocket-Accept: {accept}\r\n\r\n').encode())
+        await writer.drain()
+
+        client = LiveClient(writer, decimation=decimation, delta=delta)
+        self.clients.add(client)
+        print(f"LIVE: klient {writer.get_extra_info('peername')} "
+              f"(decymacja {client.decimation}, delta {client.delta})")
+
+        sender = asyncio.ensure_future(self._sender(client))
+        try:
+            await self._receiver(reader, client)
+        finally:
+            self.clients.discard(client)
+            sender.cancel()
+            await asyncio.gather(sender, return_exceptions=True)
+
+    async def _receiver(self, reader, client):
+        """Obsługa ramek od klienta: ping -> pong, close -> koniec"""
+        while True:
+            try:
+                opcode, payload = await read_websocket_frame(reader)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                return
+            except ValueError:
+                # 1009 - wiadomość za duża
+                client.writer.write(websocket_frame(struct.pack('!H', 1009), opcode=0x8))
+                return
+            if opcode == 0x8:
+                client.writer.write(websocket_frame(payload[:2], opcode=0x8))
+                return
+            if opcode == 0x9:
+                client.writer.write(websocket_frame(payload, opcode=0xA))
+
+    async def _sender(self, client):
+        """Wysyła najnowszą ramkę; drain() blokuje tylko tego klienta"""
+        try:
+            while True:
+                await client.wakeup.wait()
+                client.wakeup.clear()
+                frame, client.latest = client.latest, None
+                if frame is None:
+                    continue
+
+                # Zmiana zakresu kwantyzacji zmienia wszystkie piksele - wtedy pełna ramka
+                use_delta = (client.delta and client.previous is not None
+                             and client.since_keyframe < KEYFRAME_INTERVAL
+                             and client.previous['rd'].shape == frame['rd'].shape
+                             and client.previous['ra'].shape == frame['ra'].shape
+                             and client.previous['rd_range'] == frame['rd_range']
+                             and client.previous['ra_range'] == frame['ra_range'])
+                payload = encode_frame(frame, client.previous if use_delta else None)
+                client.since_keyframe = client.since_keyframe + 1 if use_delta else 0
+                client.previous = frame
+
+                data = websocket_frame(payload)
+                client.writer.write(data)
+                await client.writer.drain()
+                client.sent += 1
+                client.bytes_sent += len(data)
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+
+def detect_strongest_target(ra_map, angle_axis, range_axis):
+    """Najsilniejszy punkt mapy Range-Angle jako detekcja (zasięg, kąt, moc)"""
+    r_idx, a_idx = np.unravel_index(np.argmax(ra_map), ra_map.shape)
+    return [(range_axis[r_idx], angle_axis[a_idx], ra_map[r_idx, a_idx])]
+
+def replay_files(file_list, server, frame_rate=LIVE_FRAME_RATE, loop=False):
+    """Odtwarza pliki .cf32 jako strumień na żywo z zadanym tempem"""
+    period = 1.0 / frame_rate
+    range_axis = calculate_range_axis()
+
+    while True:
+        next_time = time.perf_counter()
+        with RadarFramePrefetcher(file_list) as prefetcher:
+            for file_path, data in prefetcher:
+                if data is None:
+                    continue
+                rd_map = generate_range_doppler_map(data, tx_idx=0, rx_idx=0)
+                ra_map, angle_fft_size = generate_range_angle_map(data, tx_idx=0)
+                detections = detect_strongest_target(
+                    ra_map, calculate_angle_axis(angle_fft_size), range_axis)
+                server.publish(rd_map, ra_map, detections)
+
+                next_time += period
+                time.sleep(max(0.0, next_time - time.perf_counter()))
+        if not loop:
+            break
+
+VIEWER_HTML = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Radar FMCW - podgląd na żywo</title></head>
+<body style="background:#222;color:#ddd;font-family:monospace">
+<canvas id="rd" width="256" height="256"></canvas>
+<canvas id="ra" width="256" height="256"></canvas>
+<pre id="info"></pre>
+<script>
+const ws = new WebSocket('ws://' + location.host + '/' + location.search);
+ws.binaryType = 'arraybuffer';
+let prev = null;
+let pending = Promise.resolve();   // Ramki obsługiwane po kolei - delta zależy od poprzedniej
+async function inflate(bytes) {
+  const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('deflate'));
+  return new Uint8Array(await new Response(stream).arrayBuffer());
+}
+function draw(id, data, rows, cols) {
+  const c = document.getElementById(id), ctx = c.getContext('2d');
+  c.width = cols; c.height = rows;
+  const img = ctx.createImageData(cols, rows);
+  for (let r = 0; r < rows; r++) for (let k = 0; k < cols; k++) {
+    const v = data[r * cols + k], o = ((rows - 1 - r) * cols + k) * 4;
+    img.data[o] = v; img.data[o + 1] = 255 - Math.abs(2 * v - 255); img.data[o + 2] = 255 - v; img.data[o + 3] = 255;
+  }
+  ctx.putImageData(img, 0, 0);
+  c.style.width = '400px'; c.style.height = '400px';
+}
+async function handle(ev) {
+  const dv = new DataView(ev.data);
+  const flags = dv.getUint8(5), id = dv.getUint32(8, true);
+  const rdR = dv.getUint16(12, true), rdC = dv.getUint16(14, true);
+  const raR = dv.getUint16(16, true), raC = dv.getUint16(18, true);
+  const nDet = dv.getUint16(20, true);
+  const maxRange = dv.getFloat32(40, true), mapLen = dv.getUint32(44, true);
+  let maps = new Uint8Array(ev.data, 48, mapLen);
+  if (flags & 2) maps = await inflate(maps);
+  if (flags & 1) {
+    if (!prev) return;
+    maps = maps.map((d, i) => (prev[i] + d) & 255);
+  }
+  prev = maps;
+  draw('rd', maps.subarray(0, rdR * rdC), rdR, rdC);
+  draw('ra', maps.subarray(rdR * rdC), raR, raC);
+  const det = new Float32Array(ev.data.slice(48 + mapLen, 48 + mapLen + nDet * 12));
+  let text = 'ramka ' + id + ' (max ' + maxRange.toFixed(1) + ' m)\\n';
+  for (let i = 0; i < nDet; i++) text += 'cel: ' + det[3*i].toFixed(2) + ' m, ' + det[3*i+1].toFixed(0) + '°\\n';
+  document.getElementById('info').textContent = text;
+}
+ws.onmessage = (ev) => { pending = pending.then(() => handle(ev)).catch((e) => console.error(e)); };
+</script></body></html>
+"""
+
+def main():
+    """Odtwarzanie folderu z plikami przez serwer na żywo"""
+    if len(sys.argv) < 2:
+        print("Użycie: python live_server.py <folder_z_plikami_cf32> [port]")
+        return
+
+    file_list = sorted(Path(sys.argv[1]).rglob('*.cf32'))
+    if not file_list:
+        print("Nie znaleziono plików .cf32!")
+        return
+
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else LIVE_PORT
+    server = LiveVisualizationServer(port=port).start()
+    try:
+        replay_files(file_list, server, loop=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for s in server.stats():
+            print(f"LIVE: {s['peer']} wysłane {s['sent']}, zgubione {s['dropped']}, {s['bytes']} B")
+        server.stop()
+
+if __name__ == "__main__":
+    main()
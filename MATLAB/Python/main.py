@@ -2,6 +2,10 @@ import numpy as np
 import matplotlib.pyplot as plt
 import os
 import glob
+import json
+import queue
+import threading
+import time
 from pathlib import Path
 
 # --- 1. KONFIGURACJA RADARU IWR1443 ---
@@ -18,6 +22,12 @@ TOTAL_CHIRPS = 256  # Rzeczywista wartość z plików
 # Parametry fizyczne anteny (dla range-angle)
 LAMBDA = 0.0039     # Długość fali dla 77 GHz (w metrach)
 ANTENNA_SPACING = LAMBDA / 2  # Typowy odstęp między antenami
+ANGLE_FFT_SIZE = 64 # Rozmiar FFT kątowego (z paddingiem)
+
+# Geometria anten IWR1443 w jednostkach lambda/2 (dla kalibracji kanałów wirtualnych)
+# TX1 i TX3 w azymucie rozsunięte o 4 elementy, TX2 podniesiony w elewacji
+TX_AZIMUTH_OFFSET = (0, 2, 4)
+TX_ELEVATION_OFFSET = (0, 1, 0)
 
 # Parametry kalibracji - WYMAGAJĄ DOSTOSOWANIA do rzeczywistej konfiguracji radaru
 # Te wartości zależą od parametrów chirp w mmWave Studio!
@@ -36,6 +46,14 @@ print(f"DOPPLER: PRF = {PRF:.1f} Hz, Okres ramki = {FRAME_PERIOD*1000:.1f}ms")
 # Folder z danymi
 DATA_FOLDER = '1_one_person_raw_fmcw_data-20250414T204939Z-004'
 
+# Ile plików wczytywać z wyprzedzeniem w tle (read-ahead)
+PREFETCH_DEPTH = 2
+
+# Profil kalibracji zbiorczej (odpowiednik compRangeBiasAndRxChanPhase z .cfg)
+CALIBRATION_FILE = 'calibration_profile.json'
+CALIBRATION_PROFILE = None  # Wczytany profil (None = kalibracja per scenariusz)
+RANGE_BIAS = 0.0            # Stały błąd zasięgu [m] odejmowany od osi zasięgu
+
 def load_radar_data(filepath):
     """Wczytuje i organizuje dane z pliku .cf32"""
     try:
@@ -62,6 +80,167 @@ def load_radar_data(filepath):
     
     return data
 
+class RadarFramePrefetcher:
+    """Wczytuje kolejne pliki w tle do puli buforów, żeby I/O nakładało się z obliczeniami"""
+
+    _END = object()
+
+    def __init__(self, file_list, depth=PREFETCH_DEPTH):
+        self.file_list = list(file_list)
+        self.depth = max(1, int(depth))
+
+        # Pula buforów: depth w kolejce + 1 trzymany przez konsumenta
+        frame_size = N_RX * TOTAL_CHIRPS * N_ADC_SAMPLES
+        self._buffers = [np.empty(frame_size, dtype=np.complex64) for _ in range(self.depth + 1)]
+        self._free = queue.Queue()
+        for slot in range(len(self._buffers)):
+            self._free.put(slot)
+        # Ograniczona kolejka - także ramki spoza puli (nietypowy rozmiar) nie wyprzedzają
+        # konsumenta o więcej niż depth plików
+        self._ready = queue.Queue(maxsize=self.depth)
+        self._stop = threading.Event()
+        self._held_slot = None
+        self._last_yield = None
+        self._done = None        # Stan końcowy (StopIteration lub błąd) zgłaszany przy każdym next()
+
+        # Statystyki czasu [s]
+        self.read_time = 0.0     # czas odczytu i dekodowania (wątek w tle)
+        self.io_wait_time = 0.0  # czas, w którym konsument czekał na dane
+        self.compute_time = 0.0  # czas przetwarzania po stronie konsumenta
+        self.frames = 0
+
+        self._thread = threading.Thread(target=self._worker, daemon=True)
+        self._thread.start()
+
+    def _read_into(self, filepath, slot):
+        """Czyta plik bezpośrednio do bufora z puli (bez alokacji)"""
+        buffer = self._buffers[slot]
+        try:
+            file_size = os.path.getsize(filepath)
+        except OSError:
+            file_size = -1
+
+        if file_size != buffer.nbytes:
+            # Nietypowy rozmiar - zwykły loader z dopasowaniem liczby chirpów
+            return load_radar_data(filepath), None
+
+        with open(filepath, 'rb') as f:
+            f.readinto(buffer.view(np.uint8))
+        return buffer.reshape(TOTAL_CHIRPS, N_RX, N_ADC_SAMPLES), slot
+
+    def _put(self, item):
+        """Wstawia element do kolejki gotowych; przerywa, gdy konsument zamknął prefetcher"""
+        while not self._stop.is_set():
+            try:
+                self._ready.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _worker(self):
+        """Wątek w tle: pobiera wolny bufor, wczytuje plik, przekazuje dalej"""
+        try:
+            for filepath in self.file_list:
+                slot = None
+                while slot is None:
+                    if self._stop.is_set():
+                        return
+                    try:
+                        slot = self._free.get(timeout=0.1)
+                    except queue.Empty:
+                        pass
+
+                t0 = time.perf_counter()
+                try:
+                    data, used_slot = self._read_into(filepath, slot)
+                except BaseException:
+                    self._free.put(slot)
+                    raise
+                self.read_time += time.perf_counter() - t0
+
+                if used_slot is None:
+                    self._free.put(slot)
+                if not self._put((filepath, data, used_slot)):
+                    return
+        except Exception as exc:
+            # Błąd odczytu (katalog, brak uprawnień, błąd NFS) - przekazujemy konsumentowi
+            self._put(exc)
+            return
+
+        self._put(self._END)
+
+    def _release_held(self):
+        """Oddaje do puli bufor poprzedniej ramki"""
+        if self._held_slot is not None:
+            self._free.put(self._held_slot)
+            self._held_slot = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._done is not None:
+            # Iteracja już zakończona (koniec listy, błąd lub close()) - nie czekamy na kolejkę
+            raise self._done
+
+        now = time.perf_counter()
+        if self._last_yield is not None:
+            self.compute_time += now - self._last_yield
+        # Poprzednia ramka przestaje być ważna - jej bufor wraca do puli
+        self._release_held()
+
+        item = self._ready.get()
+        self.io_wait_time += time.perf_counter() - now
+
+        if item is self._END:
+            self._last_yield = None
+            self._done = StopIteration()
+            raise self._done
+        if isinstance(item, Exception):
+            # Wątek w tle zakończył się błędem - zgłaszamy go w wątku konsumenta
+            self._last_yield = None
+            self._done = item
+            raise item
+
+        filepath, data, slot = item
+        self._held_slot = slot
+        self.frames += 1
+        self._last_yield = time.perf_counter()
+        return filepath, data
+
+    def close(self):
+        """Zatrzymuje wątek w tle"""
+        self._stop.set()
+        self._release_held()
+        self._thread.join()
+        if self._done is None:
+            self._done = StopIteration()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def stats(self):
+        """Zwraca statystyki: czas oczekiwania na I/O vs czas obliczeń"""
+        return {
+            'frames': self.frames,
+            'depth': self.depth,
+            'read_time': self.read_time,
+            'io_wait_time': self.io_wait_time,
+            'compute_time': self.compute_time,
+        }
+
+    def print_stats(self):
+        """Wypisuje podsumowanie statystyk prefetchera"""
+        s = self.stats()
+        print(f"PREFETCH: {s['frames']} plików, głębokość {s['depth']}, "
+              f"odczyt {s['read_time']*1000:.1f}ms, "
+              f"oczekiwanie na I/O {s['io_wait_time']*1000:.1f}ms, "
+              f"obliczenia {s['compute_time']*1000:.1f}ms")
+
 def generate_range_doppler_map(radar_cube, tx_idx=0, rx_idx=0):
     """Generuje mapę Range-Doppler dla wybranej kombinacji TX/RX"""
     # Demultipleksacja TDM MIMO - wybieramy chirpy z jednego nadajnika
@@ -128,7 +307,7 @@ def generate_range_angle_map(radar_cube, tx_idx=0, range_bin=None):
     
     # Angle FFT (po antenach) dla każdego range bin
     # Padding dla lepszej rozdzielczości kątowej
-    angle_fft_size = 64  # Zwiększamy rozmiar FFT dla lepszej rozdzielczości
+    angle_fft_size = ANGLE_FFT_SIZE  # Zwiększamy rozmiar FFT dla lepszej rozdzielczości
     angle_fft = np.fft.fft(range_fft.T, n=angle_fft_size, axis=1)
     angle_fft = np.fft.fftshift(angle_fft, axes=1)
     
@@ -159,9 +338,13 @@ def calculate_angle_axis(angle_fft_size):
 def calculate_range_axis():
     """Oblicza rzeczywistą skalę zasięgu w metrach"""
     range_bins = np.arange(N_ADC_SAMPLES // 2)
-    ranges_m = range_bins * RANGE_RESOLUTION
+    ranges_m = range_bins * RANGE_RESOLUTION - RANGE_BIAS
     return ranges_m
 
+def calculate_range_extent():
+    """Zakres osi zasięgu [m] dla imshow (uwzględnia bias z profilu kalibracji)"""
+    return -RANGE_BIAS, MAX_RANGE - RANGE_BIAS
+
 def calculate_doppler_axis(n_doppler_bins):
     """Oblicza rzeczywistą skalę prędkości Doppler w m/s"""
     # Doppler bins są wycentrowane wokół 0 (brak ruchu)
@@ -300,6 +483,204 @@ def analyze_range_profile(radar_cube, expected_distance=None):
     
     return range_profile, detected_ranges, peak_powers, range_axis
 
+def get_expected_position(params):
+    """Zwraca oczekiwaną odległość [m] i kąt [°] z parametrów folderu (lub None)"""
+    expected_distance = None
+    expected_angle = None
+    
+    if 'distance' in params:
+        distance_str = params['distance'].replace('m', '')
+        try:
+            expected_distance = float(distance_str)
+        except:
+            pass
+    
+    if 'angle' in params:
+        angle_str = params['angle'].replace('°', '')
+        try:
+            expected_angle = float(angle_str)
+        except:
+            pass
+    
+    return expected_distance, expected_angle
+
+def virtual_channel_range_fft(radar_cube):
+    """Range FFT dla wszystkich kanałów wirtualnych (TX x RX) naraz"""
+    # Pełne pętle TDM MIMO: (pętle, TX, RX, próbki)
+    n_loops = radar_cube.shape[0] // N_TX
+    loops = radar_cube[:n_loops * N_TX].reshape(n_loops, N_TX, N_RX, N_ADC_SAMPLES)
+    
+    # Usuwanie DC i uśrednianie po pętlach (cel statyczny)
+    loops = loops - np.mean(loops, axis=3, keepdims=True)
+    averaged_data = np.mean(loops, axis=0).reshape(N_TX * N_RX, N_ADC_SAMPLES)
+    
+    range_win = np.blackman(N_ADC_SAMPLES)
+    range_fft = np.fft.fft(averaged_data * range_win, axis=1)
+    return range_fft[:, :N_ADC_SAMPLES//2]
+
+def measure_calibration_target(radar_cube, expected_distance):
+    """Znajduje cel w pobliżu oczekiwanej odległości i zwraca (bin zasięgu, próbki kanałów)"""
+    range_fft = virtual_channel_range_fft(radar_cube)
+    profile = np.sum(np.abs(range_fft), axis=0)
+    profile[:5] = 0
+    
+    # Szukamy w szerokim oknie +/- 50% - rozdzielczość zasięgu może być jeszcze błędna
+    expected_bin = expected_distance / RANGE_RESOLUTION
+    range_start = max(5, int(expected_bin * 0.5))
+    range_end = min(len(profile) - 1, int(expected_bin * 1.5) + 1)
+    if range_end - range_start < 3:
+        return None, None
+    
+    peak = range_start + int(np.argmax(profile[range_start:range_end]))
+    
+    # Interpolacja paraboliczna dla sub-binowej dokładności
+    a, b, c = profile[peak-1], profile[peak], profile[peak+1]
+    denom = a - 2*b + c
+    offset = 0.5 * (a - c) / denom if denom != 0 else 0.0
+    
+    return peak + offset, range_fft[:, peak]
+
+def calibrate_dataset(scenarios):
+    """Kalibracja zbiorcza: bias zasięgu i zespolone wzmocnienia kanałów wirtualnych"""
+    print("\n=== KALIBRACJA ZBIORCZA (cały zbiór danych) ===")
+    
+    # Tylko scenariusze z oznaczonym kątem i odległością
+    labeled = []
+    for name, files in scenarios.items():
+        expected_distance, expected_angle = get_expected_position(parse_folder_name(name))
+        if expected_distance and expected_angle is not None and files:
+            labeled.append((name, files[0], expected_distance, expected_angle))
+    
+    if not labeled:
+        print("Brak oznaczonych scenariuszy do kalibracji")
+        return None
+    
+    print(f"Scenariusze z oznaczeniem kąta/odległości: {len(labeled)}")
+    
+    # Pomiary: wykryty bin zasięgu i próbki 12 kanałów wirtualnych na piku
+    detected_bins = []
+    channel_samples = []
+    expected_distances = []
+    expected_angles = []
+    with RadarFramePrefetcher([item[1] for item in labeled]) as prefetcher:
+        for (name, _, expected_distance, expected_angle), (_, data) in zip(labeled, prefetcher):
+            if data is None:
+                continue
+            peak_bin, samples = measure_calibration_target(data, expected_distance)
+            if peak_bin is None:
+                continue
+            detected_bins.append(peak_bin)
+            channel_samples.append(samples)
+            expected_distances.append(expected_distance)
+            expected_angles.append(expected_angle)
+        prefetcher.print_stats()
+    
+    if len(detected_bins) < 2:
+        print("Za mało pomiarów do kalibracji")
+        return None
+    
+    detected_bins = np.array(detected_bins)
+    channel_samples = np.array(channel_samples)   # (scenariusze, kanały)
+    expected_distances = np.array(expected_distances)
+    expected_angles = np.array(expected_angles)
+    
+    # Bias i rozdzielczość rozdziela dopiero pomiar w co najmniej dwóch różnych odległościach
+    if len(np.unique(np.round(expected_distances, 3))) < 2:
+        print("Za mało różnych odległości do kalibracji zasięgu (potrzebne co najmniej 2)")
+        return None
+    
+    # ZASIĘG: expected = resolution * bin - bias (jedno rozwiązanie LS)
+    A = np.column_stack([detected_bins, -np.ones_like(detected_bins)])
+    (range_resolution, range_bias), *_ = np.linalg.lstsq(A, expected_distances, rcond=None)
+    
+    # KANAŁY: x_k = g_k * s * a_k(theta); normalizacja do kanału referencyjnego usuwa nieznane s
+    # Pozycje azymutalne kanałów wirtualnych (kanał k = tx*N_RX + rx) z tabeli geometrii
+    tx_index = np.repeat(np.arange(N_TX), N_RX)
+    positions = np.array(TX_AZIMUTH_OFFSET)[tx_index] + np.tile(np.arange(N_RX), N_TX)
+    
+    # Faza TX z przesunięciem w elewacji zależy od nieznanego kąta elewacji -
+    # taka grupa jest kalibrowana względem własnego pierwszego kanału
+    elevated = np.array(TX_ELEVATION_OFFSET)[tx_index] != 0
+    reference = np.where(elevated, tx_index * N_RX, 0)
+    
+    steering = np.exp(1j * np.pi * np.outer(np.sin(np.deg2rad(expected_angles)), positions))
+    normalized = channel_samples / channel_samples[:, reference]
+    steering = steering / steering[:, reference]
+    
+    # LS dla każdego kanału jednocześnie: g_k = sum(y * conj(a)) / sum(|a|^2)
+    gains = np.sum(normalized * np.conj(steering), axis=0) / np.sum(np.abs(steering)**2, axis=0)
+    
+    # Współczynniki kompensacji jak w TI: odwrotność wzmocnienia, najsłabszy kanał = 1
+    compensation = 1 / gains
+    compensation = compensation / np.max(np.abs(compensation))
+    
+    residual = expected_distances - (range_resolution * detected_bins - range_bias)
+    print(f"Rozdzielczość zasięgu: {range_resolution:.4f}m (było {RANGE_RESOLUTION:.4f}m)")
+    print(f"Bias zasięgu: {range_bias:.3f}m, błąd RMS: {np.sqrt(np.mean(residual**2)):.3f}m")
+    print(f"Fazy kanałów [°]: {np.round(np.angle(compensation, deg=True), 1).tolist()}")
+    if elevated.any():
+        print(f"   ⚠️  Kanały {np.flatnonzero(elevated).tolist()} (TX w elewacji) - "
+              f"faza tylko względem własnej grupy TX")
+    
+    # Linia cfg TI zakłada jedną referencję fazy - kanały kalibrowane względem własnej
+    # grupy dostają neutralne 1 0 (pełna kompensacja tylko w channel_compensation)
+    cfg_compensation = np.where(elevated, 1.0 + 0j, compensation)
+    comp_values = " ".join(f"{c.real:.4f} {c.imag:.4f}" for c in cfg_compensation)
+    profile = {
+        'range_resolution': float(range_resolution),
+        'range_bias': float(range_bias),
+        'channel_compensation': [[float(c.real), float(c.imag)] for c in compensation],
+        # Geometria użyta w dopasowaniu i kanał, względem którego liczona jest faza
+        'virtual_antenna_positions': positions.tolist(),
+        'phase_reference_channel': reference.tolist(),
+        'n_scenarios': int(len(detected_bins)),
+        'cfg': f"compRangeBiasAndRxChanPhase {range_bias:.4f} {comp_values}",
+        'cfg_neutral_channels': np.flatnonzero(elevated).tolist(),
+    }
+    return profile
+
+def save_calibration_profile(profile, filepath=CALIBRATION_FILE):
+    """Zapisuje profil kalibracji do pliku JSON"""
+    with open(filepath, 'w') as f:
+        json.dump(profile, f, indent=2)
+    print(f"Zapisano profil kalibracji: {filepath}")
+    print(f"Linia .cfg: {profile['cfg']}")
+    if profile.get('cfg_neutral_channels'):
+        print(f"   Kanały {profile['cfg_neutral_channels']} w .cfg jako 1 0 (inna referencja fazy)")
+
+def load_calibration_profile(filepath=CALIBRATION_FILE):
+    """Wczytuje profil kalibracji i ustawia globalne parametry zasięgu"""
+    global CALIBRATION_PROFILE, RANGE_RESOLUTION, MAX_RANGE, RANGE_BIAS
+    
+    try:
+        with open(filepath) as f:
+            profile = json.load(f)
+    except FileNotFoundError:
+        return None
+    
+    # Współczynniki kanałów jako tablica (TX, RX) - gotowa do mnożenia
+    compensation = np.array([complex(re, im) for re, im in profile['channel_compensation']])
+    profile['compensation'] = compensation.astype(np.complex64).reshape(N_TX, N_RX)
+    profile['_coeff_cache'] = {}
+    
+    RANGE_RESOLUTION = profile['range_resolution']
+    MAX_RANGE = RANGE_RESOLUTION * (N_ADC_SAMPLES // 2)
+    RANGE_BIAS = profile['range_bias']
+    CALIBRATION_PROFILE = profile
+    
+    print(f"Wczytano profil kalibracji: {filepath} ({profile['n_scenarios']} scenariuszy)")
+    return profile
+
+def apply_calibration_profile(radar_cube, profile):
+    """Stosuje kompensację kanałów jako jedno mnożenie przez wcześniej obliczoną tablicę"""
+    n_chirps = radar_cube.shape[0]
+    coeff = profile['_coeff_cache'].get(n_chirps)
+    if coeff is None:
+        # Chirp c pochodzi z nadajnika c % N_TX - powielamy wiersze (TX, RX)
+        coeff = np.resize(profile['compensation'], (n_chirps, N_RX))[:, :, np.newaxis]
+        profile['_coeff_cache'][n_chirps] = coeff
+    return radar_cube * coeff
+
 def find_radar_files(base_folder, pattern="*.cf32"):
     """Znajduje wszystkie pliki radar z danego folderu"""
     folder_path = Path(base_folder)
@@ -315,32 +696,52 @@ def find_radar_files(base_folder, pattern="*.cf32"):
 
 def analyze_scenario(folder_name, file_list, multi_frame=False):
     """Analizuje scenariusz z jednego folderu"""
-    print(f"\n=== Analizuję scenariusz: {folder_name} ===")
-    
-    # Wyciągnij parametry ze nazwy folderu
-    params = parse_folder_name(folder_name)
-    print(f"Parametry: {params}")
-    
-    if multi_frame and len(file_list) > 1:
-        # Tryb multi-frame: łączymy kilka klatek
-        print(f"Przetwarzam {min(3, len(file_list))} klatek razem")
-        all_data = []
-        for file_path in file_list[:3]:  # Ograniczamy do pierwszych 3 plików
-            data = load_radar_data(file_path)
-            if data is not None:
-                all_data.append(data)
+    analyze_scenarios({folder_name: file_list}, [folder_name], multi_frame)
+
+def analyze_scenarios(scenarios, scenario_names, multi_frame=False):
+    """Analizuje kolejne scenariusze; pliki następnych wczytywane w tle podczas obliczeń"""
+    # Pliki wszystkich scenariuszy w jednej kolejce prefetchera
+    jobs = []
+    prefetch_files = []
+    for folder_name in scenario_names:
+        file_list = scenarios[folder_name]
+        if not file_list:
+            continue
+        # Tryb multi-frame: pierwsze 3 pliki łączone razem, inaczej pierwsza klatka
+        use_multi = multi_frame and len(file_list) > 1
+        selected = file_list[:3] if use_multi else file_list[:1]
+        jobs.append((folder_name, use_multi, len(selected)))
+        prefetch_files.extend(selected)
+
+    with RadarFramePrefetcher(prefetch_files) as prefetcher:
+        for folder_name, use_multi, n_files in jobs:
+            print(f"\n=== Analizuję scenariusz: {folder_name} ===")
+            
+            # Wyciągnij parametry ze nazwy folderu
+            params = parse_folder_name(folder_name)
+            print(f"Parametry: {params}")
+            
+            if use_multi:
+                print(f"Przetwarzam {n_files} klatek razem")
+                all_data = []
+                for _ in range(n_files):
+                    file_path, data = next(prefetcher)
+                    if data is not None:
+                        # Kopia - bufor wraca do puli przy następnym pliku
+                        all_data.append(data.copy())
+                
+                if all_data:
+                    # Łączymy dane z różnych klatek
+                    combined_data = np.concatenate(all_data, axis=0)
+                    process_single_scenario(folder_name, combined_data, "Multi-frame", params)
+            else:
+                print("Przetwarzam pojedynczą klatkę")
+                file_path, data = next(prefetcher)
+                if data is not None:
+                    # Obliczenia na buforze z puli - w tym czasie wątek czyta kolejny scenariusz
+                    process_single_scenario(folder_name, data, os.path.basename(file_path), params)
         
-        if all_data:
-            # Łączymy dane z różnych klatek
-            combined_data = np.concatenate(all_data, axis=0)
-            process_single_scenario(folder_name, combined_data, "Multi-frame", params)
-    else:
-        # Tryb single-frame: analizujemy pierwszą klatkę
-        print("Przetwarzam pojedynczą klatkę")
-        first_file = file_list[0]
-        data = load_radar_data(first_file)
-        if data is not None:
-            process_single_scenario(folder_name, data, os.path.basename(first_file), params)
+        prefetcher.print_stats()
 
 def parse_folder_name(folder_name):
     """Wyciąga parametry z nazwy folderu"""
@@ -369,39 +770,33 @@ def process_single_scenario(scenario_name, radar_cube, file_info, params):
     global RANGE_RESOLUTION, MAX_RANGE
     
     # Wyciągnij oczekiwaną odległość i kąt z nazwy
-    expected_distance = None
-    expected_angle = None
-    
-    if 'distance' in params:
-        distance_str = params['distance'].replace('m', '')
-        try:
-            expected_distance = float(distance_str)
-        except:
-            pass
-    
-    if 'angle' in params:
-        angle_str = params['angle'].replace('°', '')
-        try:
-            expected_angle = float(angle_str)
-        except:
-            pass
-    
-    # KALIBRACJA ZASIĘGU: Sprawdź rzeczywiste odbicia
-    corrected_resolution, corrected_max_range, range_profile = calibrate_range_scale(
-        radar_cube, expected_distance, scenario_name)
-    
-    # Zastosuj korekcję zasięgu jeśli jest znacząca
-    if abs(corrected_resolution - RANGE_RESOLUTION) > 0.001:
-        print(f"   ✅ STOSUJE KOREKTĘ ZASIĘGU dla tego scenariusza")
-        RANGE_RESOLUTION = corrected_resolution
-        MAX_RANGE = corrected_max_range
+    expected_distance, expected_angle = get_expected_position(params)
+    
+    if CALIBRATION_PROFILE is not None:
+        # Profil zbiorczy: kalibracja zasięgu już w globalnych parametrach,
+        # fazy kanałów - jedno mnożenie
+        radar_cube = apply_calibration_profile(radar_cube, CALIBRATION_PROFILE)
+        range_profile, _, _, _ = analyze_range_profile(radar_cube, expected_distance)
+        angle_axis_corrected = None  # Oś z rozmiaru FFT zwróconego przez generate_range_angle_map
+        angle_offset = 0
+        print(f"   ✅ STOSUJE PROFIL KALIBRACJI ZBIORCZEJ")
+    else:
+        # KALIBRACJA ZASIĘGU: Sprawdź rzeczywiste odbicia
+        corrected_resolution, corrected_max_range, range_profile = calibrate_range_scale(
+            radar_cube, expected_distance, scenario_name)
+        
+        # Zastosuj korekcję zasięgu jeśli jest znacząca
+        if abs(corrected_resolution - RANGE_RESOLUTION) > 0.001:
+            print(f"   ✅ STOSUJE KOREKTĘ ZASIĘGU dla tego scenariusza")
+            RANGE_RESOLUTION = corrected_resolution
+            MAX_RANGE = corrected_max_range
 
-    # KALIBRACJA KĄTA: Sprawdź rzeczywiste kąty
-    angle_axis_corrected, angle_offset = calibrate_angle_scale(
-        radar_cube, expected_angle, expected_distance, scenario_name)
-    
-    if abs(angle_offset) > 5:
-        print(f"   ✅ STOSUJE KOREKTĘ KĄTA: {angle_offset:.1f}°")
+        # KALIBRACJA KĄTA: Sprawdź rzeczywiste kąty
+        angle_axis_corrected, angle_offset = calibrate_angle_scale(
+            radar_cube, expected_angle, expected_distance, scenario_name)
+        
+        if abs(angle_offset) > 5:
+            print(f"   ✅ STOSUJE KOREKTĘ KĄTA: {angle_offset:.1f}°")
     
     # Przygotuj wykres z dodatkowym panelem dla profilu zasięgu  
     fig = plt.figure(figsize=(18, 14))
@@ -427,7 +822,7 @@ def process_single_scenario(scenario_name, radar_cube, file_info, params):
     
     im1 = ax1.imshow(rd_map, aspect='auto', origin='lower', cmap='viridis', 
                      vmin=vmin_rd, vmax=vmax_rd,
-                     extent=[velocity_axis[0], velocity_axis[-1], 0, MAX_RANGE])
+                     extent=[velocity_axis[0], velocity_axis[-1], *calculate_range_extent()])
     ax1.set_title(f'Range-Doppler (TX1/RX1)\nMax vel: ±{max_velocity:.1f} m/s (±{max_velocity*3.6:.1f} km/h)')
     ax1.set_ylabel('Odległość [m]')
     ax1.set_xlabel('Prędkość radialna [m/s]')
@@ -444,7 +839,7 @@ def process_single_scenario(scenario_name, radar_cube, file_info, params):
     
     im2 = ax2.imshow(rd_map2, aspect='auto', origin='lower', cmap='viridis', 
                      vmin=vmin_rd2, vmax=vmax_rd2,
-                     extent=[velocity_axis2[0], velocity_axis2[-1], 0, MAX_RANGE])
+                     extent=[velocity_axis2[0], velocity_axis2[-1], *calculate_range_extent()])
     ax2.set_title(f'Range-Doppler (TX1/RX4)\nRozdzielczość: {vel_resolution:.3f} m/s')
     ax2.set_ylabel('Odległość [m]')
     ax2.set_xlabel('Prędkość radialna [m/s]')
@@ -460,7 +855,7 @@ def process_single_scenario(scenario_name, radar_cube, file_info, params):
     ax3.grid(True, alpha=0.3)
     
     # Oznacz oczekiwaną odległość
-    if expected_distance and expected_distance < MAX_RANGE:
+    if expected_distance and expected_distance < calculate_range_extent()[1]:
         ax3.axvline(x=expected_distance, color='red', linestyle='--', 
                    label=f'Oczekiwane: {expected_distance}m')
         ax3.legend()
@@ -470,7 +865,9 @@ def process_single_scenario(scenario_name, radar_cube, file_info, params):
     ra_map, angle_fft_size = generate_range_angle_map(radar_cube, tx_idx=0)
     
     # Użyj skorygowanej skali kątowej
-    if len(angle_axis_corrected) != angle_fft_size:
+    if angle_axis_corrected is None:
+        angle_axis_corrected = calculate_angle_axis(angle_fft_size)
+    elif len(angle_axis_corrected) != angle_fft_size:
         print(f"OSTRZEŻENIE: Rozmiar angle_axis ({len(angle_axis_corrected)}) != angle_fft_size ({angle_fft_size})")
         angle_axis_corrected = np.linspace(-180, 180, angle_fft_size)
     
@@ -479,7 +876,7 @@ def process_single_scenario(scenario_name, radar_cube, file_info, params):
     
     im4 = ax4.imshow(ra_map, aspect='auto', origin='lower', cmap='viridis', 
                      vmin=vmin_ra, vmax=vmax_ra,
-                     extent=[angle_axis_corrected[0], angle_axis_corrected[-1], 0, MAX_RANGE])
+                     extent=[angle_axis_corrected[0], angle_axis_corrected[-1], *calculate_range_extent()])
     ax4.set_title('Range-Angle (TX1) - Skalibrowany')
     ax4.set_ylabel('Odległość [m]')
     ax4.set_xlabel('Kąt azymutowy [°]')
@@ -508,7 +905,7 @@ def process_single_scenario(scenario_name, radar_cube, file_info, params):
     
     im5 = ax5.imshow(ra_map2, aspect='auto', origin='lower', cmap='viridis', 
                      vmin=vmin_ra2, vmax=vmax_ra2,
-                     extent=[angle_axis_corrected[0], angle_axis_corrected[-1], 0, MAX_RANGE])
+                     extent=[angle_axis_corrected[0], angle_axis_corrected[-1], *calculate_range_extent()])
     ax5.set_title('Range-Angle (TX3) - Porównanie MIMO')
     ax5.set_ylabel('Odległość [m]')
     ax5.set_xlabel('Kąt azymutowy [°]')
@@ -549,7 +946,7 @@ def process_single_scenario(scenario_name, radar_cube, file_info, params):
     for r_idx in range(0, ra_map.shape[0], ra_map.shape[0]//10):  # Sample every 10%
         for a_idx in range(0, ra_map.shape[1], ra_map.shape[1]//20):  # Sample every 5%
             if ra_map[r_idx, a_idx] > vmin_ra + 0.8 * (vmax_ra - vmin_ra):
-                range_val = r_idx * MAX_RANGE / ra_map.shape[0]
+                range_val = range_axis[r_idx]
                 angle_val = angle_axis_corrected[a_idx]
                 peak_ranges.append(range_val)
                 peak_angles.append(angle_val)
@@ -614,8 +1011,18 @@ def main():
     print("2. Multi-frame (łączenie kilku klatek - dokładniejsze)")
     print("3. Porównanie scenariuszy")
     print("4. Test kątów >90° (112°, 136°)")
+    print("5. Kalibracja zbiorcza (zasięg + fazy kanałów, zapis profilu)")
     
-    choice = input("Wybierz tryb (1/2/3/4) [domyślnie 1]: ").strip()
+    choice = input("Wybierz tryb (1/2/3/4/5) [domyślnie 1]: ").strip()
+    
+    if choice == "5":
+        profile = calibrate_dataset(scenarios)
+        if profile is not None:
+            save_calibration_profile(profile)
+        return
+    
+    # Profil kalibracji zbiorczej (jeśli istnieje) zastępuje kalibrację per scenariusz
+    load_calibration_profile()
     
     if choice == "3":
         compare_scenarios(scenarios)
@@ -639,9 +1046,7 @@ def main():
     # Analizuj wybrane scenariusze
     scenario_names = list(scenarios.keys())[:num_scenarios]
     
-    for scenario_name in scenario_names:
-        files = scenarios[scenario_name]
-        analyze_scenario(scenario_name, files, multi_frame)
+    analyze_scenarios(scenarios, scenario_names, multi_frame)
     
     print(f"\n=== Analiza zakończona - {num_scenarios} scenariuszy ===")
 
@@ -686,39 +1091,43 @@ def compare_scenarios(scenarios, max_compare=4):
     if len(selected_scenarios) == 1:
         axes = axes.reshape(-1, 1)
     
-    for i, scenario_name in enumerate(selected_scenarios):
-        files = scenarios[scenario_name]
-        first_file = files[0]
-        data = load_radar_data(first_file)
-        
-        if data is not None:
-            # Range-Doppler z rzeczywistymi prędkościami
-            rd_map = generate_range_doppler_map(data, tx_idx=0, rx_idx=0)
-            velocity_axis, max_vel, vel_res = calculate_doppler_axis(rd_map.shape[1])
-            vmin_rd = np.percentile(rd_map, 10)
-            vmax_rd = np.percentile(rd_map, 90)
+    # Pierwsze pliki scenariuszy wczytywane w tle podczas przetwarzania poprzednich
+    first_files = [scenarios[name][0] for name in selected_scenarios]
+    with RadarFramePrefetcher(first_files) as prefetcher:
+        for i, (scenario_name, (first_file, data)) in enumerate(zip(selected_scenarios, prefetcher)):
+            if data is not None:
+                if CALIBRATION_PROFILE is not None:
+                    data = apply_calibration_profile(data, CALIBRATION_PROFILE)
+            
+                # Range-Doppler z rzeczywistymi prędkościami
+                rd_map = generate_range_doppler_map(data, tx_idx=0, rx_idx=0)
+                velocity_axis, max_vel, vel_res = calculate_doppler_axis(rd_map.shape[1])
+                vmin_rd = np.percentile(rd_map, 10)
+                vmax_rd = np.percentile(rd_map, 90)
             
-            axes[0,i].imshow(rd_map, aspect='auto', origin='lower', cmap='viridis', 
-                           vmin=vmin_rd, vmax=vmax_rd,
-                           extent=[velocity_axis[0], velocity_axis[-1], 0, MAX_RANGE])
-            params = parse_folder_name(scenario_name)
-            axes[0,i].set_title(f"R-D: {params.get('angle', 'N/A')}, {params.get('distance', 'N/A')}\n±{max_vel:.1f}m/s")
-            axes[0,i].set_ylabel('Odległość [m]')
-            axes[0,i].set_xlabel('Prędkość [m/s]')
-            axes[0,i].axvline(x=0, color='white', alpha=0.7, linewidth=1)  # 0 m/s
+                axes[0,i].imshow(rd_map, aspect='auto', origin='lower', cmap='viridis', 
+                               vmin=vmin_rd, vmax=vmax_rd,
+                               extent=[velocity_axis[0], velocity_axis[-1], *calculate_range_extent()])
+                params = parse_folder_name(scenario_name)
+                axes[0,i].set_title(f"R-D: {params.get('angle', 'N/A')}, {params.get('distance', 'N/A')}\n±{max_vel:.1f}m/s")
+                axes[0,i].set_ylabel('Odległość [m]')
+                axes[0,i].set_xlabel('Prędkość [m/s]')
+                axes[0,i].axvline(x=0, color='white', alpha=0.7, linewidth=1)  # 0 m/s
             
-            # Range-Angle
-            ra_map, angle_fft_size = generate_range_angle_map(data, tx_idx=0)
-            angle_axis = calculate_angle_axis(angle_fft_size)
-            vmin_ra = np.percentile(ra_map, 10)
-            vmax_ra = np.percentile(ra_map, 90)
-            axes[1,i].imshow(ra_map, aspect='auto', origin='lower', cmap='viridis', 
-                           vmin=vmin_ra, vmax=vmax_ra,
-                           extent=[angle_axis[0], angle_axis[-1], 0, MAX_RANGE])
-            axes[1,i].set_title(f"R-A: {params.get('angle', 'N/A')}, {params.get('distance', 'N/A')}")
-            axes[1,i].set_ylabel('Odległość [m]')
-            axes[1,i].set_xlabel('Kąt [°]')
-            axes[1,i].grid(True, alpha=0.3)
+                # Range-Angle
+                ra_map, angle_fft_size = generate_range_angle_map(data, tx_idx=0)
+                angle_axis = calculate_angle_axis(angle_fft_size)
+                vmin_ra = np.percentile(ra_map, 10)
+                vmax_ra = np.percentile(ra_map, 90)
+                axes[1,i].imshow(ra_map, aspect='auto', origin='lower', cmap='viridis', 
+                               vmin=vmin_ra, vmax=vmax_ra,
+                               extent=[angle_axis[0], angle_axis[-1], *calculate_range_extent()])
+                axes[1,i].set_title(f"R-A: {params.get('angle', 'N/A')}, {params.get('distance', 'N/A')}")
+                axes[1,i].set_ylabel('Odległość [m]')
+                axes[1,i].set_xlabel('Kąt [°]')
+                axes[1,i].grid(True, alpha=0.3)
+        
+        prefetcher.print_stats()
     
     plt.suptitle('Porównanie scenariuszy - Range-Doppler (góra) i Range-Angle (dół)', fontsize=14)
     plt.tight_layout()
@@ -742,12 +1151,9 @@ def test_large_angles(scenarios):
         print(f"{i+1}. {name} - {params}")
     
     if test_scenarios:
-        # Analizuj pierwsze 3 scenariusze
-        for scenario_name in test_scenarios[:3]:
-            files = scenarios[scenario_name]
-            if files:
-                print(f"\n🧪 TESTUJE: {scenario_name}")
-                analyze_scenario(scenario_name, files, multi_frame=False)
+        # Analizuj pierwsze 3 scenariusze (pliki kolejnych wczytywane w tle)
+        print(f"\n🧪 TESTUJE: {', '.join(test_scenarios[:3])}")
+        analyze_scenarios(scenarios, test_scenarios[:3], multi_frame=False)
     else:
         print("Brak scenariuszy z kątami >90°")
 
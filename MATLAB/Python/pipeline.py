@@ -0,0 +1,427 @@
+"""Wieloprocesowy pipeline przetwarzania z buforami pierścieniowymi w pamięci współdzielonej
+
+Każda grupa etapów działa w osobnym procesie (omija GIL):
+    ingest (odczyt .cf32) -> [pierścień kostek complex64] -> DSP (Range-Doppler
+    + Range-Angle) -> [pierścień map float32] -> odbiorca w procesie głównym
+
+Kostki radarowe nie są serializowane (pickle) - producent zapisuje je wprost
+do slotu w pamięci współdzielonej, a między procesami przekazywane są tylko
+liczniki zapisu/odczytu. Każdy pierścień ma dokładnie jednego producenta
+i jednego konsumenta (SPSC), więc indeksy nie wymagają blokad.
+
+Uruchomienie (jeden folder = jeden radar):
+    python pipeline.py <folder_radaru_1> [<folder_radaru_2> ...]
+"""
+import multiprocessing as mp
+import os
+import sys
+import time
+from multiprocessing import shared_memory
+from pathlib import Path
+
+import numpy as np
+
+from main import (N_TX, N_RX, N_ADC_SAMPLES, TOTAL_CHIRPS, ANGLE_FFT_SIZE,
+                  generate_range_doppler_map, generate_range_angle_map,
+                  calculate_range_axis, calculate_angle_axis)
+
+# --- KONFIGURACJA PIPELINE ---
+RING_SLOTS = 8            # Liczba slotów w każdym pierścieniu
+POLL_INTERVAL = 0.0005    # [s] odstęp odpytywania pustego/pełnego pierścienia
+
+# Nagłówek sterujący pierścienia (int64): licznik zapisu, licznik odczytu, zamknięty
+_HEADER_WRITE = 0
+_HEADER_READ = 1
+_HEADER_CLOSED = 2
+_HEADER_BYTES = 64        # Dane slotów wyrównane za nagłówkiem
+
+# Statystyki etapu w tablicy współdzielonej: ramki, czas pracy, czas oczekiwania
+STAGES = ('ingest', 'dsp')
+_STAT_FRAMES = 0
+_STAT_BUSY = 1
+_STAT_WAIT = 2
+_STAT_FIELDS = 3
+
+class SharedFrameRing:
+    """Pierścień slotów o stałym kształcie w pamięci współdzielonej (1 producent, 1 konsument)"""
+
+    def __init__(self, slot_shapes, dtype=np.complex64, n_slots=RING_SLOTS, name=None):
+        # slot_shapes: kształt slotu lub krotka kształtów (kilka tablic w jednym slocie)
+        if isinstance(slot_shapes[0], int):
+            slot_shapes = (tuple(slot_shapes),)
+        self.slot_shapes = tuple(tuple(shape) for shape in slot_shapes)
+        self.dtype = np.dtype(dtype)
+        self.n_slots = n_slots
+
+        sizes = [int(np.prod(shape)) * self.dtype.itemsize for shape in self.slot_shapes]
+        self.slot_bytes = sum(sizes)
+        total = _HEADER_BYTES + self.n_slots * self.slot_bytes
+
+        self._owner = name is None
+        if self._owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=total)
+        else:
+            # Procesy potomne dzielą resource_tracker z rodzicem - usuwa tylko właściciel
+            self.shm = shared_memory.SharedMemory(name=name)
+
+        self.header = np.ndarray(3, dtype=np.int64, buffer=self.shm.buf)
+        if self._owner:
+            self.header[:] = 0
+
+        # Widoki na każdy slot - tworzone raz, bez kopiowania
+        self.slots = []
+        for slot in range(self.n_slots):
+            offset = _HEADER_BYTES + slot * self.slot_bytes
+            views = []
+            for shape, size in zip(self.slot_shapes, sizes):
+                views.append(np.ndarray(shape, dtype=self.dtype, buffer=self.shm.buf, offset=offset))
+                offset += size
+            self.slots.append(views)
+
+    @property
+    def spec(self):
+        """Opis pozwalający podłączyć się do pierścienia w innym procesie"""
+        return (self.slot_shapes, self.dtype.str, self.n_slots, self.shm.name)
+
+    @classmethod
+    def attach(cls, spec):
+        """Podłącza się do istniejącego pierścienia"""
+        slot_shapes, dtype, n_slots, name = spec
+        return cls(slot_shapes, dtype=dtype, n_slots=n_slots, name=name)
+
+    def backlog(self):
+        """Liczba zapisanych, a jeszcze nie odczytanych slotów"""
+        return int(self.header[_HEADER_WRITE] - self.header[_HEADER_READ])
+
+    # --- Strona producenta ---
+
+    def acquire_write(self):
+        """Zwraca widoki wolnego slotu lub None, gdy pierścień jest pełny"""
+        write = self.header[_HEADER_WRITE]
+        if write - self.header[_HEADER_READ] >= self.n_slots:
+            return None
+        return self.slots[write % self.n_slots]
+
+    def commit_write(self):
+        """Publikuje zapisany slot konsumentowi (dane zapisane przed indeksem)"""
+        self.header[_HEADER_WRITE] += 1
+
+    def close_writer(self):
+        """Oznacza koniec strumienia - konsument dokończy resztę slotów"""
+        self.header[_HEADER_CLOSED] = 1
+
+    # --- Strona konsumenta ---
+
+    def acquire_read(self):
+        """Zwraca widoki najstarszego slotu lub None, gdy pierścień jest pusty"""
+        read = self.header[_HEADER_READ]
+        if read >= self.header[_HEADER_WRITE]:
+            return None
+        return self.slots[read % self.n_slots]
+
+    def release_read(self):
+        """Zwalnia odczytany slot dla producenta"""
+        self.header[_HEADER_READ] += 1
+
+    def drained(self):
+        """Producent zakończył i wszystkie sloty zostały odczytane"""
+        return bool(self.header[_HEADER_CLOSED]) and self.backlog() == 0
+
+    def close(self):
+        """Odłącza pamięć (właściciel dodatkowo ją usuwa)"""
+        self.slots = []
+        self.header = None
+        self.shm.close()
+        if self._owner:
+            self.shm.unlink()
+
+def _wait_for(acquire, stop_event, stats, stage, done=None):
+    """Odpytuje pierścień do skutku; czas oczekiwania trafia do statystyk etapu"""
+    t0 = time.perf_counter()
+    views = acquire()
+    while views is None and not stop_event.is_set() and not (done and done()):
+        time.sleep(POLL_INTERVAL)
+        views = acquire()
+    stats[stage * _STAT_FIELDS + _STAT_WAIT] += time.perf_counter() - t0
+    return views
+
+def _frame_file_size(filepath):
+    """Rozmiar pliku w bajtach lub -1, gdy nie da się go odczytać"""
+    try:
+        return os.path.getsize(filepath)
+    except OSError:
+        return -1
+
+def filter_frame_files(file_list, frame_bytes):
+    """Zostawia tylko pliki o rozmiarze slotu; pozostałe zgłasza raz"""
+    valid = []
+    sample_bytes = N_RX * N_ADC_SAMPLES * np.dtype(np.complex64).itemsize
+    for filepath in file_list:
+        file_size = _frame_file_size(filepath)
+        if file_size == frame_bytes:
+            valid.append(filepath)
+        elif file_size > 0 and file_size % sample_bytes == 0:
+            print(f"UWAGA: Pomijam {os.path.basename(filepath)} - {file_size // sample_bytes} chirpów "
+                  f"zamiast {TOTAL_CHIRPS} (sloty pierścienia mają stały kształt)")
+        else:
+            print(f"UWAGA: Pomijam {os.path.basename(filepath)} - nietypowy rozmiar lub brak pliku")
+    return valid
+
+def _ingest_stage(file_list, ring_spec, stats, stop_event, frame_rate, loop):
+    """Proces ingest: czyta pliki wprost do slotów pierścienia kostek"""
+    ring = SharedFrameRing.attach(ring_spec)
+    stage = STAGES.index('ingest')
+    period = 1.0 / frame_rate if frame_rate else 0.0
+    next_time = time.perf_counter()
+    files = list(file_list)
+    try:
+        while files and not stop_event.is_set():
+            for filepath in list(files):
+                if stop_event.is_set():
+                    break
+                views = _wait_for(ring.acquire_write, stop_event, stats, stage)
+                if views is None:
+                    break
+
+                t0 = time.perf_counter()
+                cube = views[0]
+                if _frame_file_size(filepath) != cube.nbytes:
+                    # Plik zmienił się od startu - usuwamy go z rotacji (zgłoszenie tylko raz)
+                    print(f"UWAGA: Pomijam {os.path.basename(filepath)} - nietypowy rozmiar")
+                    files.remove(filepath)
+                    continue
+                with open(filepath, 'rb') as f:
+                    f.readinto(cube.reshape(-1).view(np.uint8))
+                ring.commit_write()
+                stats[stage * _STAT_FIELDS + _STAT_FRAMES] += 1
+                stats[stage * _STAT_FIELDS + _STAT_BUSY] += time.perf_counter() - t0
+
+                if period:
+                    next_time += period
+                    time.sleep(max(0.0, next_time - time.perf_counter()))
+            if not loop:
+                break
+    finally:
+        ring.close_writer()
+        ring.close()
+
+def _dsp_stage(in_spec, out_spec, stats, stop_event):
+    """Proces DSP: Range-Doppler i Range-Angle z kostki, wynik do pierścienia map"""
+    cubes = SharedFrameRing.attach(in_spec)
+    maps = SharedFrameRing.attach(out_spec)
+    stage = STAGES.index('dsp')
+    try:
+        while not stop_event.is_set():
+            in_views = _wait_for(cubes.acquire_read, stop_event, stats, stage, done=cubes.drained)
+            if in_views is None:
+                break
+            out_views = _wait_for(maps.acquire_write, stop_event, stats, stage)
+            if out_views is None:
+                break
+
+            t0 = time.perf_counter()
+            cube = in_views[0]
+            # Range-Doppler przed Range-Angle - ta druga usuwa DC w miejscu
+            out_views[0][:] = generate_range_doppler_map(cube, tx_idx=0, rx_idx=0)
+            out_views[1][:], _ = generate_range_angle_map(cube, tx_idx=0)
+            cubes.release_read()
+            maps.commit_write()
+            stats[stage * _STAT_FIELDS + _STAT_FRAMES] += 1
+            stats[stage * _STAT_FIELDS + _STAT_BUSY] += time.perf_counter() - t0
+    finally:
+        maps.close_writer()
+        cubes.close()
+        maps.close()
+
+class RadarPipeline:
+    """Pipeline jednego radaru: proces ingest + proces DSP, odbiór map w procesie głównym"""
+
+    def __init__(self, file_list, name='radar', n_slots=RING_SLOTS, frame_rate=None, loop=False):
+        self.name = name
+        frame_bytes = TOTAL_CHIRPS * N_RX * N_ADC_SAMPLES * np.dtype(np.complex64).itemsize
+        self.file_list = filter_frame_files([str(f) for f in file_list], frame_bytes)
+        if not self.file_list:
+            print(f"UWAGA: {name} - brak poprawnych plików, pipeline zakończy się od razu")
+        self.frame_rate = frame_rate
+        self.loop = loop
+
+        n_chirps = TOTAL_CHIRPS
+        n_range = N_ADC_SAMPLES // 2
+        # Kształt mapy RD zależy od liczby chirpów jednego TX (jak w generate_range_doppler_map)
+        n_doppler = len(range(0, n_chirps, N_TX))
+        self.cubes = SharedFrameRing((n_chirps, N_RX, N_ADC_SAMPLES), np.complex64, n_slots)
+        self.maps = SharedFrameRing(((n_range, n_doppler), (n_range, ANGLE_FFT_SIZE)),
+                                    np.float32, n_slots)
+
+        self.stats = mp.Array('d', len(STAGES) * _STAT_FIELDS, lock=False)
+        self.stop_event = mp.Event()
+        self.processes = []
+        self.frames_out = 0
+        self._held = False
+        self._start_time = None
+
+    def start(self):
+        """Uruchamia procesy etapów"""
+        self.processes = [
+            mp.Process(target=_ingest_stage, name=f'{self.name}-ingest',
+                       args=(self.file_list, self.cubes.spec, self.stats, self.stop_event,
+                             self.frame_rate, self.loop)),
+            mp.Process(target=_dsp_stage, name=f'{self.name}-dsp',
+                       args=(self.cubes.spec, self.maps.spec, self.stats, self.stop_event)),
+        ]
+        for process in self.processes:
+            process.start()
+        self._start_time = time.perf_counter()
+        return self
+
+    def _release_held(self):
+        """Oddaje do DSP slot map trzymany od poprzedniego poll(copy=False)"""
+        if self._held:
+            self.maps.release_read()
+            self._held = False
+
+    def poll(self, copy=True):
+        """Zwraca (rd_map, ra_map) kolejnej ramki lub None
+
+        copy=False zwraca widoki na pamięć współdzieloną bez kopiowania - ważne tylko
+        do następnego poll() i nigdy po stop() (pamięć jest wtedy odmapowana).
+        """
+        # Poprzednie mapy przestają być ważne - slot wraca do DSP
+        self._release_held()
+        views = self.maps.acquire_read()
+        if views is None:
+            return None
+        self.frames_out += 1
+        if copy:
+            result = views[0].copy(), views[1].copy()
+            self.maps.release_read()
+            return result
+        self._held = True
+        return views[0], views[1]
+
+    def finished(self):
+        """Wszystkie ramki zostały przetworzone i odebrane"""
+        return self.maps.drained() or (
+            self.maps.backlog() == 0 and not any(p.is_alive() for p in self.processes))
+
+    def health(self):
+        """Metryki: ramki, obciążenie i oczekiwanie etapów, zaległości pierścieni"""
+        elapsed = time.perf_counter() - self._start_time if self._start_time else 0.0
+        stages = {}
+        for i, stage in enumerate(STAGES):
+            frames = self.stats[i * _STAT_FIELDS + _STAT_FRAMES]
+            busy = self.stats[i * _STAT_FIELDS + _STAT_BUSY]
+            stages[stage] = {
+                'frames': int(frames),
+                'busy_time': busy,
+                'wait_time': self.stats[i * _STAT_FIELDS + _STAT_WAIT],
+                'fps': frames / elapsed if elapsed else 0.0,
+                'utilization': busy / elapsed if elapsed else 0.0,
+            }
+        return {
+            'name': self.name,
+            'stages': stages,
+            'cube_backlog': self.cubes.backlog(),
+            'map_backlog': self.maps.backlog(),
+            'frames_out': self.frames_out,
+            'alive': {p.name: p.is_alive() for p in self.processes},
+        }
+
+    def print_health(self):
+        """Wypisuje metryki pipeline"""
+        h = self.health()
+        stage_str = ", ".join(
+            f"{name}: {s['frames']} ramek, {s['fps']:.1f} fps, obciążenie {s['utilization']*100:.0f}%"
+            for name, s in h['stages'].items())
+        print(f"PIPELINE {h['name']}: {stage_str}, "
+              f"zaległości kostki/mapy {h['cube_backlog']}/{h['map_backlog']}")
+
+    def stop(self, timeout=5.0):
+        """Zatrzymuje procesy i zwalnia pamięć współdzieloną"""
+        self.stop_event.set()
+        for process in self.processes:
+            if process.pid is None:
+                # Nie uruchomiony (błąd startu wcześniejszego etapu)
+                continue
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        # Widoki z poll(copy=False) tracą ważność przed odmapowaniem pamięci
+        self._release_held()
+        self.cubes.close()
+        self.maps.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+def run_pipelines(sources, frame_rate=None, on_frame=None, report_every=2.0):
+    """Uruchamia pipeline dla każdego radaru i odbiera mapy po kolei (round-robin)
+
+    sources: słownik {nazwa radaru: lista plików .cf32}
+    on_frame: funkcja (nazwa, rd_map, ra_map) wołana dla każdej ramki; mapy są widokami
+              ważnymi tylko na czas wywołania (skopiować, jeśli mają być zachowane)
+    """
+    pipelines = [RadarPipeline(files, name=name, frame_rate=frame_rate)
+                 for name, files in sources.items()]
+
+    last_report = time.perf_counter()
+    try:
+        # Start w try - błąd startu kolejnego radaru zatrzymuje już uruchomione
+        for pipeline in pipelines:
+            pipeline.start()
+
+        active = list(pipelines)
+        while active:
+            got_frame = False
+            for pipeline in list(active):
+                result = pipeline.poll(copy=False)
+                if result is not None:
+                    got_frame = True
+                    if on_frame is not None:
+                        on_frame(pipeline.name, *result)
+                elif pipeline.finished():
+                    active.remove(pipeline)
+            if not got_frame:
+                time.sleep(POLL_INTERVAL)
+
+            if time.perf_counter() - last_report > report_every:
+                for pipeline in pipelines:
+                    pipeline.print_health()
+                last_report = time.perf_counter()
+    finally:
+        for pipeline in pipelines:
+            pipeline.print_health()
+            pipeline.stop()
+    return pipelines
+
+def main():
+    """Przetwarza jeden lub kilka folderów (radarów) w wieloprocesowym pipeline"""
+    if len(sys.argv) < 2:
+        print("Użycie: python pipeline.py <folder_radaru_1> [<folder_radaru_2> ...]")
+        return
+
+    sources = {}
+    for folder in sys.argv[1:]:
+        files = sorted(Path(folder).rglob('*.cf32'))
+        if files:
+            sources[Path(folder).name] = files
+        else:
+            print(f"Nie znaleziono plików .cf32 w {folder}")
+    if not sources:
+        return
+
+    range_axis = calculate_range_axis()
+    angle_axis = calculate_angle_axis(ANGLE_FFT_SIZE)
+
+    def report_target(name, rd_map, ra_map):
+        r_idx, a_idx = np.unravel_index(np.argmax(ra_map), ra_map.shape)
+        print(f"{name}: cel {range_axis[r_idx]:.2f}m, {angle_axis[a_idx]:.0f}°")
+
+    run_pipelines(sources, on_frame=report_target)
+
+if __name__ == "__main__":
+    main()
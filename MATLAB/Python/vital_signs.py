@@ -0,0 +1,238 @@
+"""Strumieniowa estymacja parametrów życiowych (oddech / tętno) z fazy binu zasięgu
+
+Po zablokowaniu na binie zasięgu osoby (pik profilu zasięgu lub tracker) każda
+ramka daje jedną zespoloną próbkę. Faza jest rozwijana przyrostowo, filtrowana
+rekurencyjnymi filtrami IIR (biquady) na pasmo oddechu i tętna, a częstotliwość
+szacowana przesuwnym DFT aktualizowanym próbka po próbce. Koszt na ramkę i
+pamięć są stałe - niezależne od długości nagrania.
+
+Uruchomienie na nagraniu:
+    python vital_signs.py <folder_z_plikami_cf32> [oczekiwana_odległość_m]
+"""
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from main import (N_TX, N_ADC_SAMPLES, LAMBDA, RadarFramePrefetcher, analyze_range_profile,
+                  calculate_range_axis)
+
+# --- KONFIGURACJA ---
+VITAL_FRAME_RATE = 10.0         # [Hz] okres ramki 100 ms (frameCfg)
+VITAL_WINDOW = 256              # Długość okna przesuwnego DFT [ramki] (~25 s)
+BREATHING_BAND = (0.1, 0.5)     # [Hz] 6-30 oddechów/min
+HEART_BAND = (0.8, 2.0)         # [Hz] 48-120 uderzeń/min
+
+class Biquad:
+    """Filtr IIR 2. rzędu (transponowana postać bezpośrednia II), stan przenoszony między próbkami"""
+
+    def __init__(self, b, a):
+        self.b0, self.b1, self.b2 = b[0] / a[0], b[1] / a[0], b[2] / a[0]
+        self.a1, self.a2 = a[1] / a[0], a[2] / a[0]
+        self.z1 = 0.0
+        self.z2 = 0.0
+
+    @classmethod
+    def lowpass(cls, cutoff, fs, q=1 / np.sqrt(2)):
+        """Dolnoprzepustowy Butterworth (wzory RBJ)"""
+        w0 = 2 * np.pi * cutoff / fs
+        alpha = np.sin(w0) / (2 * q)
+        cos_w0 = np.cos(w0)
+        b = ((1 - cos_w0) / 2, 1 - cos_w0, (1 - cos_w0) / 2)
+        a = (1 + alpha, -2 * cos_w0, 1 - alpha)
+        return cls(b, a)
+
+    @classmethod
+    def highpass(cls, cutoff, fs, q=1 / np.sqrt(2)):
+        """Górnoprzepustowy Butterworth (wzory RBJ)"""
+        w0 = 2 * np.pi * cutoff / fs
+        alpha = np.sin(w0) / (2 * q)
+        cos_w0 = np.cos(w0)
+        b = ((1 + cos_w0) / 2, -(1 + cos_w0), (1 + cos_w0) / 2)
+        a = (1 + alpha, -2 * cos_w0, 1 - alpha)
+        return cls(b, a)
+
+    def process(self, x):
+        """Filtruje jedną próbkę"""
+        y = self.b0 * x + self.z1
+        self.z1 = self.b1 * x - self.a1 * y + self.z2
+        self.z2 = self.b2 * x - self.a2 * y
+        return y
+
+class BandPassFilter:
+    """Pasmowo-przepustowy jako kaskada biquadów HP + LP"""
+
+    def __init__(self, band, fs, stages=1):
+        low, high = band
+        self.sections = []
+        for _ in range(stages):
+            self.sections.append(Biquad.highpass(low, fs))
+            self.sections.append(Biquad.lowpass(high, fs))
+
+    def process(self, x):
+        for section in self.sections:
+            x = section.process(x)
+        return x
+
+class SlidingDFT:
+    """Przesuwne DFT tylko dla binów z pasma - O(liczba binów) na próbkę"""
+
+    def __init__(self, band, fs, window=VITAL_WINDOW):
+        self.window = window
+        self.fs = fs
+        self.bin_width = fs / window
+
+        # Biny pasma z jednym zapasem z każdej strony (okno Hann w dziedzinie częstotliwości)
+        first = max(1, int(np.floor(band[0] / self.bin_width)))
+        last = min(window // 2 - 1, int(np.ceil(band[1] / self.bin_width)))
+        self.bins = np.arange(first - 1, last + 2)
+        self.twiddle = np.exp(2j * np.pi * self.bins / window)
+
+        self.buffer = np.zeros(window)   # Bufor kołowy ostatnich próbek
+        self.spectrum = np.zeros(len(self.bins), dtype=np.complex128)
+        self.count = 0
+
+    def update(self, x):
+        """Dodaje próbkę, usuwa najstarszą z okna"""
+        pos = self.count % self.window
+        oldest = self.buffer[pos]
+        self.buffer[pos] = x
+        self.count += 1
+        self.spectrum = (self.spectrum + x - oldest) * self.twiddle
+
+        if pos == self.window - 1:
+            # Raz na okno pełne przeliczenie - kasuje dryf numeryczny rekurencji
+            samples = np.roll(self.buffer, -(pos + 1))
+            n = np.arange(self.window)
+            kernel = np.exp(-2j * np.pi * np.outer(self.bins, n) / self.window)
+            self.spectrum = kernel @ samples
+
+    def ready(self):
+        """Okno zapełnione - estymacja jest wiarygodna"""
+        return self.count >= self.window
+
+    def peak_frequency(self):
+        """Częstotliwość dominującego piku w paśmie [Hz] (okno Hann + interpolacja)"""
+        # Okno Hann jako splot widma z [-1/4, 1/2, -1/4]
+        hann = 0.5 * self.spectrum[1:-1] - 0.25 * (self.spectrum[:-2] + self.spectrum[2:])
+        magnitude = np.abs(hann)
+        peak = int(np.argmax(magnitude))
+
+        offset = 0.0
+        if 0 < peak < len(magnitude) - 1:
+            a, b, c = magnitude[peak-1], magnitude[peak], magnitude[peak+1]
+            denom = a - 2*b + c
+            offset = 0.5 * (a - c) / denom if denom != 0 else 0.0
+        return (self.bins[1 + peak] + offset) * self.bin_width
+
+def lock_range_bin(radar_cube, expected_distance=None):
+    """Wybiera bin zasięgu osoby: pik najbliżej oczekiwanej odległości lub najsilniejszy"""
+    # analyze_range_profile usuwa DC w miejscu - pracujemy na kopii
+    range_profile, detected_ranges, peak_powers, range_axis = analyze_range_profile(
+        radar_cube.copy(), expected_distance)
+
+    if detected_ranges:
+        if expected_distance:
+            target = min(detected_ranges, key=lambda r: abs(r - expected_distance))
+        else:
+            target = detected_ranges[int(np.argmax(peak_powers))]
+        return int(np.argmin(np.abs(range_axis - target)))
+    return int(np.argmax(range_profile))
+
+class StreamingVitalSigns:
+    """Ekstrakcja oddechu i tętna z fazy jednego binu zasięgu, ramka po ramce"""
+
+    def __init__(self, range_bin, frame_rate=VITAL_FRAME_RATE, window=VITAL_WINDOW):
+        self.frame_rate = frame_rate
+        self.breathing_filter = BandPassFilter(BREATHING_BAND, frame_rate)
+        self.heart_filter = BandPassFilter(HEART_BAND, frame_rate, stages=2)
+        self.breathing_dft = SlidingDFT(BREATHING_BAND, frame_rate, window)
+        self.heart_dft = SlidingDFT(HEART_BAND, frame_rate, window)
+        self.frames = 0
+        self.phase = 0.0
+        self.set_range_bin(range_bin)
+
+    def set_range_bin(self, range_bin):
+        """Zmienia bin zasięgu (np. z trackera); faza kontynuowana bez skoku"""
+        self.range_bin = int(range_bin)
+
+        # Jądro DFT dla jednego binu z oknem Blackmana (jak w analizie zasięgu)
+        n = np.arange(N_ADC_SAMPLES)
+        self.kernel = np.blackman(N_ADC_SAMPLES) * np.exp(-2j * np.pi * self.range_bin * n / N_ADC_SAMPLES)
+        self.kernel_dc = np.sum(self.kernel)
+        self.rx_weights = None
+        self.previous = None
+
+    def range_bin_sample(self, radar_cube):
+        """Zespolona wartość binu: suma po chirpach TX1, RX sumowane z wyrównaniem fazy"""
+        tx_data = radar_cube[0::N_TX, :, :]
+        # Range FFT tylko dla jednego binu; usuwanie DC przez odjęcie średniej * suma jądra
+        per_rx = np.sum(tx_data @ self.kernel - np.mean(tx_data, axis=2) * self.kernel_dc, axis=0)
+
+        if self.rx_weights is None:
+            # Wyrównanie faz anten względem pierwszej ramki po zablokowaniu
+            self.rx_weights = np.conj(per_rx) / np.maximum(np.abs(per_rx), 1e-12)
+        return np.sum(per_rx * self.rx_weights)
+
+    def update(self, radar_cube):
+        """Przetwarza jedną ramkę; zwraca przemieszczenie, sygnały pasmowe i tempo"""
+        z = self.range_bin_sample(radar_cube)
+
+        # Rozwijanie fazy przyrostowo: różnica fazy względem poprzedniej próbki
+        # (po zmianie binu pierwsza próbka tylko ustala nową referencję)
+        if self.previous is not None:
+            self.phase += np.angle(z * np.conj(self.previous))
+        self.previous = z
+        self.frames += 1
+
+        displacement = self.phase * LAMBDA / (4 * np.pi)
+        breathing = self.breathing_filter.process(displacement)
+        heart = self.heart_filter.process(displacement)
+        self.breathing_dft.update(breathing)
+        self.heart_dft.update(heart)
+
+        result = {
+            'frame': self.frames,
+            'range_bin': self.range_bin,
+            'displacement_mm': displacement * 1000,
+            'breathing_mm': breathing * 1000,
+            'heart_mm': heart * 1000,
+            'breathing_rate': None,
+            'heart_rate': None,
+        }
+        if self.breathing_dft.ready():
+            result['breathing_rate'] = self.breathing_dft.peak_frequency() * 60
+            result['heart_rate'] = self.heart_dft.peak_frequency() * 60
+        return result
+
+def main():
+    """Estymacja parametrów życiowych dla nagrania (pliki .cf32 jako kolejne ramki)"""
+    if len(sys.argv) < 2:
+        print("Użycie: python vital_signs.py <folder_z_plikami_cf32> [oczekiwana_odległość_m]")
+        return
+
+    file_list = sorted(Path(sys.argv[1]).rglob('*.cf32'))
+    if not file_list:
+        print("Nie znaleziono plików .cf32!")
+        return
+    expected_distance = float(sys.argv[2]) if len(sys.argv) > 2 else None
+
+    range_axis = calculate_range_axis()
+    vitals = None
+    with RadarFramePrefetcher(file_list) as prefetcher:
+        for file_path, data in prefetcher:
+            if data is None:
+                continue
+            if vitals is None:
+                range_bin = lock_range_bin(data, expected_distance)
+                print(f"Zablokowano na binie {range_bin} ({range_axis[range_bin]:.2f}m)")
+                vitals = StreamingVitalSigns(range_bin)
+
+            result = vitals.update(data)
+            if result['breathing_rate'] is not None and result['frame'] % int(VITAL_FRAME_RATE) == 0:
+                print(f"Ramka {result['frame']}: oddech {result['breathing_rate']:.1f}/min, "
+                      f"tętno {result['heart_rate']:.0f}/min")
+        prefetcher.print_stats()
+
+if __name__ == "__main__":
+    main()